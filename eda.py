@@ -1,10 +1,32 @@
 """This file contains all functions and logic for the first part of this
 task, i.e. the exploratory data analysis."""
+import numpy as np
 import pandas as pd
-from typing import List, Any, Tuple, Union
+from numba import njit
+from pandas.core.groupby import SeriesGroupBy
+from typing import List, Any, Callable, Tuple, Union
 import matplotlib.pyplot as plt
 
 
+def read_temperature_data(path: str) -> pd.DataFrame:
+    """Reads one of the csv-Files of the dataset (e.g.
+    "GlobalLandTemperaturesByCity.csv") with a DatetimeIndex. To reduce the
+    memory footprint, the temperature columns are read as float32 and the
+    city and country names as categories.
+
+    Args:
+        path (str): Path to the csv-File
+
+    Returns:
+        pd.DataFrame: The data of the csv-File
+    """
+    dtypes = {"AverageTemperature": "float32",
+              "AverageTemperatureUncertainty": "float32",
+              "City": "category",
+              "Country": "category"}
+    return pd.read_csv(path, index_col="dt", parse_dates=True, dtype=dtypes)
+
+
 def get_max_changes_by_country(df: pd.DataFrame,
                                start_year: str = "1850") -> pd.DataFrame:
     """Computes the most severe changes in temperature differences in all
@@ -22,29 +44,111 @@ def get_max_changes_by_country(df: pd.DataFrame,
             - 'countries': Country Name 
             - 'MaxChanges': Most Severe Temperature change for that country
     """
-    countries = df["Country"].unique()
-    max_values = []
-
-    for country in countries:
-        # get time series for the country
-        df_temp = df.loc[df["Country"]==country]
-        # resample & groupby decade to obtain mean for that decade
-        df_avg_temp_dec = df_temp[start_year:].resample("10AS").mean()
-        # get differences between data points (=Average Temperature per 
-        # decade in a country)
-        temp_diffs = df_avg_temp_dec["AverageTemperature"].diff()
-        # get max value of that country and append to list
-        max_values.append(temp_diffs.max())
-
-    return pd.DataFrame(data={"countries": countries,
+    # integer codes of all countries (in order of their first appearance).
+    # Countries without data from start_year on keep a NaN result
+    country_codes, countries = pd.factorize(df["Country"])
+    # the index does not need to be sorted for the kernel below. Rows
+    # without a country are dropped, as factorize gives them the code -1
+    in_period = (df.index >= start_year) & (country_codes >= 0)
+    # the decade of each row is derived from these integer years in the
+    # kernel, i.e. without pandas' resampling machinery
+    max_values = _max_decade_diffs(
+        country_codes[in_period],
+        df.index.year[in_period].to_numpy(dtype=np.int32),
+        df["AverageTemperature"].to_numpy()[in_period],
+        len(countries))
+
+    return pd.DataFrame(data={"countries": np.asarray(countries),
                               "MaxChanges": max_values})
 
 
-def calculate_variablity(tmp_series: pd.Series, measure: str) -> Any:
-    """ Calculates the given variability measure to a pandas Series
+@njit(cache=True)
+def _max_decade_diffs(country_codes: np.ndarray,
+                      years: np.ndarray,
+                      temps: np.ndarray,
+                      n_countries: int) -> np.ndarray:
+    """Computes the maximum difference between the average temperatures of
+    consecutive decades for each country in a single pass over the data. As
+    with resampling a country's time series to "10AS", the decades of a
+    country start at its first year in the data and decades without any
+    temperature break the differencing.
+
+    Args:
+        country_codes (np.ndarray): Integer code of the country of each row
+            (0, ..., n_countries - 1)
+        years (np.ndarray): Year of each row
+        temps (np.ndarray): Average temperature of each row (may be NaN)
+        n_countries (int): Number of countries
+
+    Returns:
+        np.ndarray: Maximum change for each country code (NaN, if there are
+            no two consecutive decades with data)
+    """
+    # first and last year of each country
+    first_years = np.full(n_countries, np.iinfo(np.int64).max)
+    last_years = np.full(n_countries, np.iinfo(np.int64).min)
+    for i in range(len(years)):
+        code = country_codes[i]
+        first_years[code] = min(first_years[code], years[i])
+        last_years[code] = max(last_years[code], years[i])
+    n_decades = 1
+    for code in range(n_countries):
+        n_years = last_years[code] - first_years[code]
+        n_decades = max(n_decades, n_years // 10 + 1)
+
+    # sum and count of the temperatures in each decade of each country
+    sums = np.zeros((n_countries, n_decades))
+    counts = np.zeros((n_countries, n_decades), dtype=np.int64)
+    for i in range(len(years)):
+        if not np.isnan(temps[i]):
+            code = country_codes[i]
+            decade = (years[i] - first_years[code]) // 10
+            sums[code, decade] += temps[i]
+            counts[code, decade] += 1
+
+    max_values = np.full(n_countries, np.nan)
+    for code in range(n_countries):
+        for decade in range(1, n_decades):
+            if counts[code, decade - 1] > 0 and counts[code, decade] > 0:
+                diff = (sums[code, decade] / counts[code, decade]
+                        - sums[code, decade - 1] / counts[code, decade - 1])
+                if np.isnan(max_values[code]) or diff > max_values[code]:
+                    max_values[code] = diff
+    return max_values
+
+
+# functions computing a variability measure of a (grouped) temperature Series
+_VARIABILITY_MEASURES = {
+    "var": lambda tmp_series: tmp_series.var(),
+    "std": lambda tmp_series: tmp_series.std(),
+    "range": lambda tmp_series: tmp_series.max() - tmp_series.min(),
+    "iqr": lambda tmp_series: (tmp_series.quantile(0.75)
+                               - tmp_series.quantile(0.25)),
+}
+
+
+def _get_variability_function(measure: str) -> Callable:
+    """Resolves a measure of variability to the function computing it.
+
+    Raises:
+        ValueError: An unknown measure was passed to the function
+    """
+    try:
+        return _VARIABILITY_MEASURES[measure]
+    except KeyError:
+        error_msg = (f"Unknown variability measure: {measure}. Please choose between: "
+                     "'var', 'std', 'range' and 'iqr'.")
+        raise ValueError(error_msg) from None
+
+
+def calculate_variablity(tmp_series: Union[pd.Series, SeriesGroupBy],
+                         measure: str) -> Any:
+    """ Calculates the given variability measure to a pandas Series. If a
+    grouped Series is passed, the measure is computed for every group.
 
     Args:
-        tmp_series (pd.Series): A temperature Series which is to be examined
+        tmp_series (pd.Series | SeriesGroupBy): A temperature Series (or a
+            grouped temperature Series) which is to be examined
         measure (str): A measure of variability. Valid choices:
             - "var": Variance
             - "std": Standard Deviation
@@ -55,20 +159,10 @@ def calculate_variablity(tmp_series: pd.Series, measure: str) -> Any:
         ValueError: An unknown measure was passed to the function
 
     Returns:
-        float: the measure as a float
+        float: the measure as a float (pd.Series of floats indexed by the
+            group keys, if a grouped Series was passed)
     """
-    if measure == "var":
-        return tmp_series.var()
-    elif measure == "std":
-        return tmp_series.std()
-    elif measure == "range":
-        return tmp_series.max() - tmp_series.min()
-    elif measure == "iqr":
-        return tmp_series.quantile(0.75) - tmp_series.quantile(0.25)
-    else:
-        error_msg = (f"Unknown variability measure: {measure}. Please choose between: "
-                     "'var', 'std', 'range' and 'iqr'.")
-        raise ValueError(error_msg)
+    return _get_variability_function(measure)(tmp_series)
 
 
 def get_n_high_variability_cities(input_df: pd.DataFrame,
@@ -103,32 +197,26 @@ def get_n_high_variability_cities(input_df: pd.DataFrame,
         pd.Dataframe: result_df, dataframe containing the variability values 
             of all citires in the given time period
     """  
-    # subset data
-    df = input_df.copy()
-    #df_city_temps.loc[(time_from <= df_city_temps.index) & (time_to >= df_city_temps.index)]
-    df = df.loc[(time_from <= df.index) & (time_to >= df.index)]
-    df = df[["AverageTemperature", "City", "Country"]]
-    #, ["AverageTemperature", "City", "Country"]]
-    # To avoid duplicate cities (in different countries)
-    df["id_City"] = df["City"] + ", " + df["Country"]
-    
-    # unique cities (Assumption: unique combination of city + country)
-    cities = df["id_City"].unique()
-    
-    variability_measures = []
-    
-    for city in cities:
-        # subset data: time 
-        df_city = df.loc[df["id_City"]==city]
-        tmp_series = df_city[time_from:time_to]["AverageTemperature"]
-        
-        variability_measures.append(calculate_variablity(tmp_series, measure))
-        
+    # resolve the measure once (and fail before any computation, if unknown)
+    variability_function = _get_variability_function(measure)
+
+    # subset data: time (input_df is only read, so no copy is needed)
+    df = _slice_time_period(input_df, time_from, time_to)
+
+    # compute the measure for all cities in one grouped pass. Group by city
+    # and country to avoid duplicate cities (in different countries)
+    # (Assumption: unique combination of city + country)
+    city_groups = df.groupby(["City", "Country"],
+                             sort=False,
+                             observed=True)["AverageTemperature"]
+    variability_measures = variability_function(city_groups)
+
     result_df = pd.DataFrame(data={
-        "cities": cities,
-        f"variability ({measure})": variability_measures 
+        "cities": [f"{city}, {country}"
+                   for city, country in variability_measures.index],
+        f"variability ({measure})": variability_measures.to_numpy()
     })
-    
+
     result_list = list(result_df.nlargest(n, f"variability ({measure})")["cities"])
     
     if return_df:
@@ -137,6 +225,20 @@ def get_n_high_variability_cities(input_df: pd.DataFrame,
         return result_list
 
 
+def _slice_time_period(df: pd.DataFrame,
+                       time_from: str,
+                       time_to: str) -> pd.DataFrame:
+    """Selects all rows of a DatetimeIndex'ed dataframe within
+    [time_from, time_to]. If the index is sorted, label slicing is used
+    (binary search on the boundaries), otherwise a boolean mask.
+    """
+    time_from = pd.Timestamp(time_from)
+    time_to = pd.Timestamp(time_to)
+    if df.index.is_monotonic_increasing:
+        return df.loc[time_from:time_to]
+    return df.loc[(time_from <= df.index) & (time_to >= df.index)]
+
+
 def plot_city_temp_over_time(df: pd.DataFrame, city: str) -> None:
     """Creates an inline plot of the Yearly Average Temperature of a given
     city, resamplying to yearly data to increase readibility. Addationaly,
@@ -149,13 +251,23 @@ def plot_city_temp_over_time(df: pd.DataFrame, city: str) -> None:
     """
     # filter city
     city_df = df.loc[df["City"]==city]
-    # resample to yearly data
-    city_df_resampled = city_df.resample("AS").mean()
-    # obtain rolling mean (10-yearly)
-    city_df_resampled["Rolling Avg."] = city_df_resampled.AverageTemperature.rolling(10).mean()
-    
-    # create plot
-    plt.figure()
+    city_df_resampled = _yearly_with_rolling(city_df)
+
+    # create plot (DataFrame.plot creates the figure itself)
     city_df_resampled.plot(figsize=(14, 8), title=f"Development of yearly Avg. Temperature for {city}")
     plt.xlabel('Year')
     plt.ylabel('Average Temperature [°C]')
+
+
+def _yearly_with_rolling(city_df: pd.DataFrame) -> pd.DataFrame:
+    """Resamples the data of one city to yearly data and adds the 10-years
+    rolling mean of the average temperature as column 'Rolling Avg.'. The
+    rolling mean is also given for the first 9 years (over fewer years).
+    """
+    # resample the numeric columns to yearly data
+    city_df_resampled = city_df.select_dtypes("number").resample("YS").mean()
+    # obtain rolling mean (10-yearly)
+    city_df_resampled["Rolling Avg."] = (city_df_resampled["AverageTemperature"]
+                                         .rolling(10, min_periods=1)
+                                         .mean())
+    return city_df_resampled
@@ -1,7 +1,8 @@
-from typing import List, Tuple
+from typing import Dict, List, Tuple, Union
 from numpy import ndarray
 import pandas as pd
-from statsmodels.tsa.holtwinters import ExponentialSmoothing
+from statsforecast import StatsForecast
+from statsforecast.models import AutoETS
 
 
 class CityWeatherForecastingModel:
@@ -14,20 +15,21 @@ class CityWeatherForecastingModel:
             pandas dataframe
         - city_list (list): List of all cities for which models are to be 
             created
-        - train_start (str): Start date of the training data.
-            Format: "YYYY-MM-DD"
-        - train_end (str): End date of the training data.
-            Format: "YYYY-MM-DD"
-        - test_start (str): Start date of the test data.
-            Format: "YYYY-MM-DD"
-        - test_start (str): End date of the test data.
-            Format: "YYYY-MM-DD"
+        - train_start (pd.Timestamp): Start date of the training data.
+        - train_end (pd.Timestamp): End date of the training data.
+        - test_start (pd.Timestamp): Start date of the test data.
+        - test_end (pd.Timestamp): End date of the test data.
         - train_data (dict): Data the model was trained on.
             Keys are city names
         - test_data (dict): Data the model can be evaluated on
             (not implemented). Keys are city names.
-        - models (dict): The trained models for each city. Keys are city names.
-            available, after 'fit' method was called.
+        - model (StatsForecast): The trained models for all cities (the
+            series are identified by the city names). available, after 'fit'
+            method was called.
+        - n_jobs (int): Number of worker processes used to fit the models.
+            -1 means using all processors.
+        - city_data (dict): Date-sorted data of each city, cached on first
+            use. Keys are city names.
     """
     
     def __init__(self,
@@ -47,41 +49,66 @@ class CityWeatherForecastingModel:
             - train_end (default: '1999-12-01')
             - test_start (default: '2000-01-01')
             - test_end (default: '2013-12-01')
-        if they are not given, the default values are used.
+            - n_jobs (default: -1)
+        if they are not given, the default values are used. The dates are
+        given in the format "YYYY-MM-DD" and are parsed once on construction.
         """
         self.data = data_df
         self.city_list = city_list
         
         # additional keyword arguments: Train/Test Split
-        self.train_start = kwargs.get("train_start", '1960-01-01')
-        self.train_end = kwargs.get("train_end", '1999-12-01')
-        self.test_start = kwargs.get("test_start", '2000-01-01')
-        self.test_end = kwargs.get("test_end", '2013-12-01')
+        self.train_start = pd.Timestamp(kwargs.get("train_start", '1960-01-01'))
+        self.train_end = pd.Timestamp(kwargs.get("train_end", '1999-12-01'))
+        self.test_start = pd.Timestamp(kwargs.get("test_start", '2000-01-01'))
+        self.test_end = pd.Timestamp(kwargs.get("test_end", '2013-12-01'))
+        self.n_jobs = kwargs.get("n_jobs", -1)
         
         self.train_data = {}
         self.test_data = {}
-        self.models = {}
+        self.model = None
+        # forecasts of all cities of the last predict call: (h, forecasts)
+        self._last_forecasts = None
+        self.city_data = {}
         
     def fit(self):
-        """Fits a model for each city in city_list attribute
+        """Fits an additive Holt-Winters model (ETS(A,A,A) without damping)
+        with yearly seasonality for each city in city_list attribute. The
+        models of all cities are fitted in one batch (in parallel).
         """
+        # only the cities of the current city_list are (re)fitted
+        self.train_data = {}
+        self.test_data = {}
+        city_frames = self._get_cities_data(self.city_list)
         for city in self.city_list:
-            city_df = self._get_city_data(city)
+            city_df = city_frames[city]
             # train-test-split
             train, test = self._prepare_train_test_data(city_df)
-            # train Holt-Winters model
-            self.models[city] = ExponentialSmoothing(train,
-                                                     trend="add",
-                                                     seasonal="add",
-                                                     seasonal_periods=12).fit()
             # store train and test data in attribute
             self.train_data[city] = train
             self.test_data[city] = test
+
+        # train data of all cities in long format
+        train_df = pd.concat([
+            pd.DataFrame(data={"unique_id": city,
+                               "ds": train.index,
+                               "y": train.to_numpy()})
+            for city, train in self.train_data.items()
+        ])
+        # train Holt-Winters models
+        self.model = StatsForecast(
+            models=[AutoETS(season_length=12, model="AAA", damped=False)],
+            freq="MS",
+            n_jobs=self.n_jobs)
+        self.model.fit(train_df)
+        self._last_forecasts = None
         
     def predict(self,
                 city: str,
                 target_date: str = None) -> ndarray:
-        """provides forecast for a given city until target date
+        """provides forecast for a given city until target date. The models
+        of all cities are forecasted at once; these forecasts are cached, so
+        repeated calls with the same horizon (e.g. for different cities) do
+        not forecast again.
 
         Args:
             city (str): The city for which the weather should be forecasted
@@ -91,12 +118,16 @@ class CityWeatherForecastingModel:
         Raises:
             ValueError: If predict method is used before fit method has
                 been called
+            ValueError: If no model was fitted for the given city
 
         Returns:
             ndarray: the predictions to each time step
         """
-        if len(self.models) == 0:
+        if self.model is None:
             raise ValueError("Models not fitted. run 'fit' method first")
+
+        if city not in self.city_list or city not in self.train_data:
+            raise ValueError(f"No model fitted for city: {city}")
         
         if target_date is None:
             target_date = self.test_end
@@ -105,7 +136,16 @@ class CityWeatherForecastingModel:
         predict_periods = self._get_time_difference_in_months(target_date,
                                                               self.test_start)
         
-        predictions = self.models[city].forecast(predict_periods)
+        # forecasts start in the month following the training data
+        if (self._last_forecasts is None
+                or self._last_forecasts[0] != predict_periods):
+            self._last_forecasts = (predict_periods,
+                                    self.model.predict(h=predict_periods))
+        forecasts = self._last_forecasts[1]
+        city_forecast = forecasts.loc[forecasts["unique_id"] == city]
+        predictions = pd.Series(city_forecast["AutoETS"].to_numpy(),
+                                index=pd.DatetimeIndex(city_forecast["ds"].to_numpy(),
+                                                       freq="MS"))
         
         return predictions
     
@@ -131,38 +171,58 @@ class CityWeatherForecastingModel:
         predictions = self.predict(city, target_date)
         predictions.plot(legend=True, label="Prediction") 
 
-    def _get_city_data(self, city: str) -> pd.DataFrame:
-        """Filters the complete dataframe for one city
+    def _get_cities_data(self, cities: List[str]) -> Dict[str, pd.DataFrame]:
+        """Filters the complete dataframe for the given cities and splits it
+        into one dataframe per city (in a single pass over the data). The
+        date-sorted city dataframes are cached in the city_data attribute, so
+        the complete dataframe is only scanned for cities not seen before.
+        Keys are city names.
         """
-        return self.data.loc[self.data["City"]==city].copy()
+        missing_cities = [city for city in cities if city not in self.city_data]
+        if missing_cities:
+            cities_df = self.data.loc[self.data["City"].isin(missing_cities)]
+            city_groups = cities_df.groupby("City", sort=False, observed=True)
+            for city, city_df in city_groups:
+                self.city_data[city] = city_df.sort_index()
+        return {city: self.city_data[city] for city in cities}
     
     def _prepare_train_test_data(self,
                                  data: pd.DataFrame
                                  ) -> Tuple[pd.Series, pd.Series]:
         """prepares train and test data:
+            - sort data by date (if necessary)
             - split data
             - drop missing values
             - select only 'AverageTemperature' column
         """
+        # label slicing requires a sorted DatetimeIndex
+        if not data.index.is_monotonic_increasing:
+            data = data.sort_index()
         train = data['AverageTemperature'][self.train_start:self.train_end].dropna()
         test = data['AverageTemperature'][self.test_start:self.test_end].dropna()
         return train, test
     
     @staticmethod
-    def _get_time_difference_in_months(date_1: str, date_2: str) -> int: 
+    def _get_time_difference_in_months(date_1: Union[str, pd.Timestamp],
+                                       date_2: Union[str, pd.Timestamp]) -> int: 
         """Computes the time difference in months between two dates. 
         necessary, because forecast-method of model takes number of datapoints
         to forecast as an input. 
 
         Args:
-            date_1 (str): Date in the format 'YYYY-MM-DD'. date_1 > date_2
-            date_2 (str): Date in the format 'YYYY-MM-DD'. date_1 > date_2
+            date_1 (str | pd.Timestamp): Date in the format 'YYYY-MM-DD' or
+                Timestamp. date_1 > date_2
+            date_2 (str | pd.Timestamp): Date in the format 'YYYY-MM-DD' or
+                Timestamp. date_1 > date_2
 
         Returns:
             int: Difference between the dates in months
         """
-        date_1 = pd.to_datetime(date_1)
-        date_2 = pd.to_datetime(date_2)
+        # only parse dates, which are not yet Timestamps
+        if not isinstance(date_1, pd.Timestamp):
+            date_1 = pd.Timestamp(date_1)
+        if not isinstance(date_2, pd.Timestamp):
+            date_2 = pd.Timestamp(date_2)
         
         diff_in_months = (date_1.year - date_2.year) * 12 + (date_1.month - date_2.month)
         return diff_in_months
@@ -0,0 +1,52 @@
+import numpy as np
+import pandas as pd
+
+from eda import get_max_changes_by_country
+
+
+def test_get_max_changes_by_country_ignores_missing_country():
+    index = pd.date_range("1850-01-01", "1879-12-01", freq="MS")
+    jumps = np.repeat([0.0, 500.0, 1000.0], 120)
+    df = pd.concat([
+        pd.DataFrame({"AverageTemperature": 10.0, "Country": "Alpha"},
+                     index=index),
+        pd.DataFrame({"AverageTemperature": 10.0, "Country": "Zulu"},
+                     index=index),
+        pd.DataFrame({"AverageTemperature": jumps, "Country": np.nan},
+                     index=index),
+    ])
+
+    result = get_max_changes_by_country(df)
+
+    assert list(result["countries"]) == ["Alpha", "Zulu"]
+    assert list(result["MaxChanges"]) == [0.0, 0.0]
+
+
+def test_get_max_changes_by_country_matches_decade_resampling():
+    rng = np.random.default_rng(0)
+    # starts mid-year
+    index_a = pd.date_range("1853-07-01", "1960-12-01", freq="MS")
+    temps_a = rng.normal(10, 3, len(index_a))
+    # leading NaNs and a gap of more than 10 years without rows
+    index_b = (pd.date_range("1820-01-01", "1880-12-01", freq="MS")
+               .append(pd.date_range("1902-03-01", "1990-12-01", freq="MS")))
+    temps_b = rng.normal(5, 4, len(index_b))
+    temps_b[:400] = np.nan
+    df = pd.concat([
+        pd.DataFrame({"AverageTemperature": temps_a, "Country": "A"},
+                     index=index_a),
+        pd.DataFrame({"AverageTemperature": temps_b, "Country": "B"},
+                     index=index_b),
+    ])
+
+    result = get_max_changes_by_country(df, start_year="1850")
+
+    decade_means = (df.loc[df.index >= "1850"]
+                    .groupby("Country")["AverageTemperature"]
+                    .resample("10YS")
+                    .mean())
+    expected = (decade_means.groupby(level="Country").diff()
+                .groupby(level="Country").max())
+    assert list(result["countries"]) == ["A", "B"]
+    np.testing.assert_allclose(result["MaxChanges"],
+                               expected.loc[["A", "B"]])